@@ -1,11 +1,73 @@
 import os
 import re
+import json
+import time
+import shutil
 import requests
+import concurrent.futures
+from threading import Lock
+from datetime import datetime, timedelta, timezone
+
+from download_control import DownloadControl, resume_headers, write_stream
+from concurrency import AdaptiveConcurrency
+from app_config import config_path
+
+API_URL = "https://api.mangadex.org"
+FEED_PAGE_LIMIT = 100 # /chapter chỉ cho tối đa 100 kết quả mỗi trang
+FEED_OFFSET_CAP = 10000 # MangaDex không cho offset + limit vượt quá 10000
+IDS_BATCH_SIZE = 100
+CONTENT_RATINGS = ['safe', 'suggestive', 'erotica', 'pornographic']
+UUID_PATTERN = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+CONFIG_FILE = config_path('mangadex.json')
+DEFAULT_LANGUAGES = ['vi']
+
+
+def validate_translation_settings(languages, preferred_groups):
+    if not (isinstance(languages, list) and languages and all(isinstance(code, str) and code for code in languages)):
+        raise ValueError(f"MangaDex languages must be a non-empty list of language codes, got {languages!r}")
+    if not (isinstance(preferred_groups, list) and all(isinstance(group, str) and group for group in preferred_groups)):
+        raise ValueError(f"MangaDex preferred_groups must be a list of group ids or names, got {preferred_groups!r}")
+
+
+def load_translation_settings(config_file=CONFIG_FILE):
+    """Đọc ngôn ngữ và nhóm dịch ưu tiên từ mangadex.json, ví dụ {"languages": ["vi", "en"], "preferred_groups": []}."""
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = {}
+
+    languages = config.get('languages', DEFAULT_LANGUAGES)
+    preferred_groups = config.get('preferred_groups', [])
+    validate_translation_settings(languages, preferred_groups)
+    return languages, preferred_groups
 
 class TruyenDexImageDownloader:
     def __init__(self, logger_callback):
         self.title = "title"
         self.logger_callback = logger_callback
+        self.control = DownloadControl()
+        self.concurrency = AdaptiveConcurrency(logger_callback=logger_callback)
+        self.lock = Lock()
+
+        self.languages = list(DEFAULT_LANGUAGES) # ưu tiên theo thứ tự
+        self.preferred_groups = [] # id hoặc tên nhóm dịch, ưu tiên theo thứ tự
+        self.sync_state_file = 'mangadex_sync.json'
+        # quá khoảng này thì feed /chapter toàn site quá dài, dùng feed riêng từng manga
+        self.global_feed_window = timedelta(days=7)
+        self.request_delay = 0.25
+        self.failed_images = 0
+
+    def stop(self):
+        self.control.stop()
+
+    def pause(self):
+        self.control.pause()
+        self.logger_callback("Paused, waiting for in-flight downloads to checkpoint...")
+
+    def resume(self):
+        self.control.resume()
+        self.logger_callback("Resumed")
 
     def setup_title(self, option: str):
         if(option == "MangaDex"):
@@ -13,35 +75,168 @@ class TruyenDexImageDownloader:
         if(option == "TruyenDex"):
             self.title = "truyen-tranh"
 
+    def setup_concurrency(self, floor: int, ceiling: int):
+        self.concurrency.setup(floor, ceiling)
+
+    def setup_translations(self, languages: list, preferred_groups: list):
+        validate_translation_settings(languages, preferred_groups)
+        self.languages = list(languages)
+        self.preferred_groups = list(preferred_groups)
+
+    def parse_manga_ids(self, text):
+        """Lấy danh sách manga id (không trùng, giữ thứ tự) từ URL / id cách nhau bởi dấu phẩy hoặc xuống dòng."""
+        return list(dict.fromkeys(re.findall(UUID_PATTERN, text.lower())))
+
+    def get_json(self, path, params=None):
+        """Trả về JSON của request, hoặc None nếu lỗi mạng / status khác 200."""
+        try:
+            response = requests.get(f"{API_URL}{path}", params=params, timeout=30)
+            self.control.sleep(self.request_delay)
+
+            if response.status_code == 200:
+                return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.logger_callback(f"Request {path} failed: {e}")
+            return None
+
+        self.logger_callback(f"Request {path} failed. Status code: {response.status_code}")
+        return None
+
+    def fetch_feed(self, path, params, since=None):
+        """Lấy hết các trang của một chapter feed, sắp theo updatedAt tăng dần.
+
+        Trả về None nếu có trang bị lỗi, để không đánh dấu manga là đã sync.
+        """
+        params = dict(params)
+        params.update({
+            'translatedLanguage[]': self.languages,
+            'contentRating[]': CONTENT_RATINGS,
+            'includes[]': ['scanlation_group'],
+            'order[updatedAt]': 'asc',
+            'limit': FEED_PAGE_LIMIT,
+        })
+        items_by_id = {}
+        offset = 0
+
+        while True:
+            if since:
+                params['updatedAtSince'] = since
+            params['offset'] = offset
+
+            data = self.get_json(path, params)
+            if data is None:
+                return None
+
+            items = data.get('data', [])
+            for item in items:
+                items_by_id[item['id']] = item
+
+            offset += len(items)
+            if not items or offset >= data.get('total', 0):
+                return list(items_by_id.values())
+
+            if offset + FEED_PAGE_LIMIT > FEED_OFFSET_CAP:
+                # hết offset cho phép: dời mốc updatedAtSince lên chapter cuối cùng rồi đếm lại từ 0
+                since = items[-1]['attributes']['updatedAt'][:19]
+                offset = 0
+
+    def chapter_entry(self, item):
+        attributes = item['attributes']
+        manga_id = None
+        groups = []
+        for relationship in item.get('relationships', []):
+            if relationship['type'] == 'manga':
+                manga_id = relationship['id']
+            elif relationship['type'] == 'scanlation_group':
+                name = relationship.get('attributes', {}).get('name', '')
+                groups.append((relationship['id'], name))
+
+        return {
+            'id': item['id'],
+            'manga_id': manga_id,
+            'volume': attributes.get('volume') or 'none',
+            'chapter': attributes.get('chapter') or 'none',
+            'language': attributes.get('translatedLanguage'),
+            'groups': groups,
+            'updated_at': attributes.get('updatedAt', '')[:19],
+            'external': bool(attributes.get('externalUrl')),
+        }
+
+    def chapter_rank(self, entry):
+        language_rank = self.languages.index(entry['language']) if entry['language'] in self.languages else len(self.languages)
+        group_rank = len(self.preferred_groups)
+        for group_id, group_name in entry['groups']:
+            for rank, preferred in enumerate(self.preferred_groups):
+                if preferred in (group_id, group_name):
+                    group_rank = min(group_rank, rank)
+        return (language_rank, group_rank)
+
+    def select_chapters(self, entries):
+        """Mỗi (manga, volume, chapter) chỉ giữ một bản dịch theo ngôn ngữ và nhóm dịch ưu tiên."""
+        selected = {}
+        for entry in entries:
+            if entry['external']:
+                continue
+            key = (entry['manga_id'], entry['volume'], entry['chapter'])
+            if key not in selected or self.chapter_rank(entry) < self.chapter_rank(selected[key]):
+                selected[key] = entry
+        return list(selected.values())
+
+    def fetch_chapter_entries(self, manga_id):
+        entries = [self.chapter_entry(item) for item in self.fetch_feed(f"/manga/{manga_id}/feed", {}) or []]
+        for entry in entries:
+            entry['manga_id'] = manga_id
+        if not entries:
+            self.logger_callback(f"No chapters found for manga: {manga_id}")
+        return self.select_chapters(entries)
+
     def fetch_chapters(self, manga_id):
         """Lấy danh sách các chapter của manga từ MangaDex API."""
-        api_url = f"https://api.mangadex.org/manga/{manga_id}/aggregate?translatedLanguage[]=vi"
-        response = requests.get(api_url)
-        
-        if response.status_code == 200:
-            data = response.json()
-            chapters = []
-            
-            for volume_number, volume_data in data.get('volumes', {}).items():
-                for chapter_number, chapter_info in volume_data.get('chapters', {}).items():
-                    chapters.append((volume_number, chapter_number, chapter_info['id'])) 
-            return chapters
-        else:
-            self.logger_callback(f"Failed to fetch chapters. Status code: {response.status_code}")
-            return []
+        return [(entry['volume'], entry['chapter'], entry['id']) for entry in self.fetch_chapter_entries(manga_id)]
+
+    def fetch_manga_titles(self, manga_ids):
+        """Trả về (titles, missing): missing chỉ gồm các id mà API trả lời là không tồn tại.
+
+        Batch nào bị lỗi request thì các id trong đó vẫn được giữ, dùng id làm tên.
+        """
+        titles = {}
+        missing = []
+        for start in range(0, len(manga_ids), IDS_BATCH_SIZE):
+            batch = manga_ids[start:start + IDS_BATCH_SIZE]
+            data = self.get_json("/manga", {
+                'ids[]': batch,
+                'limit': len(batch),
+                'contentRating[]': CONTENT_RATINGS,
+            })
+            if data is None:
+                self.logger_callback(f"Could not fetch titles for {len(batch)} manga, syncing them by id.")
+                titles.update({manga_id: manga_id for manga_id in batch})
+                continue
+
+            for item in data.get('data', []):
+                title = item['attributes'].get('title', {})
+                titles[item['id']] = next(iter(title.values()), item['id'])
+            missing.extend(manga_id for manga_id in batch if manga_id not in titles)
+        return titles, missing
 
     def fetch_images(self, chapter_id):
-        api_url = f"https://api.mangadex.org/at-home/server/{chapter_id}"
-        response = requests.get(api_url)
+        api_url = f"{API_URL}/at-home/server/{chapter_id}"
+        try:
+            response = requests.get(api_url, timeout=30)
+            data = response.json() if response.status_code == 200 else None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.mark_image_failed()
+            self.logger_callback(f"Failed to fetch images for chapter {chapter_id}: {e}")
+            return []
         
-        if response.status_code == 200:
-            data = response.json()
+        if data is not None:
             base_url = data.get('baseUrl', '')
             chapter_hash = data.get('chapter', {}).get('hash', '')  # hash
             images = data.get('chapter', {}).get('data', [])
             
             return [f"{base_url}/data/{chapter_hash}/{image}" for image in images]
         else:
+            self.mark_image_failed()
             self.logger_callback(f"Failed to fetch images for chapter {chapter_id}. Status code: {response.status_code}")
             return []
 
@@ -55,44 +250,218 @@ class TruyenDexImageDownloader:
 
         self.logger_callback(f"Starting download for manga: {manga_id}")
 
-        chapters = self.fetch_chapters(manga_id)
+        chapters = self.fetch_chapter_entries(manga_id)
         if not chapters:
             return
 
+        manga_folder = self.create_manga_folder(manga_id)
+        state = self.load_sync_state()
+
+        for entry in chapters:
+            if not self.claim_chapter(state, entry, manga_folder):
+                continue
+            self.save_sync_state(state)
+            if not self.download_chapter(manga_folder, entry['volume'], entry['chapter'], entry['id']):
+                self.logger_callback(f"Download stopped for manga: {manga_id}")
+                return
+
+        self.logger_callback(f"Download completed for manga: {manga_id}")
+
+    def create_manga_folder(self, manga_id):
         manga_folder = os.path.join(os.getcwd(), f"manga_{manga_id}")
         # os.makedirs(manga_folder, exist_ok=True)
         try:
             os.makedirs(manga_folder, exist_ok=True)
         except PermissionError:
             self.logger_callback(f"Permission denied when creating directory: {manga_folder}")
+        return manga_folder
+
+    def chapter_folder(self, manga_folder, volume, chapter):
+        return os.path.join(manga_folder, f"volume_{volume}", f"chapter_{chapter}")
+
+    def claim_chapter(self, state, entry, manga_folder):
+        """Kiểm tra chapter với bản dịch đã tải ở các lần trước (lưu trong mangadex_sync.json).
+
+        Bản của nhóm khác chỉ được tải nếu được ưu tiên hơn hẳn bản cũ, khi đó thư mục
+        chapter cũ bị xoá để ảnh của hai nhóm không lẫn vào nhau.
+        """
+        downloaded = state['chapters'].setdefault(entry['manga_id'], {})
+        key = f"{entry['volume']}/{entry['chapter']}"
+        previous = downloaded.get(key)
+
+        if previous and previous['id'] != entry['id']:
+            if self.chapter_rank(entry) >= self.chapter_rank(previous):
+                self.logger_callback(
+                    f"Skipping volume {entry['volume']}, chapter {entry['chapter']}: already downloaded from another group."
+                )
+                return False
+            self.logger_callback(
+                f"Replacing volume {entry['volume']}, chapter {entry['chapter']} with a preferred translation."
+            )
+            shutil.rmtree(self.chapter_folder(manga_folder, entry['volume'], entry['chapter']), ignore_errors=True)
+
+        downloaded[key] = {
+            'id': entry['id'],
+            'language': entry['language'],
+            'groups': [list(group) for group in entry['groups']],
+        }
+        return True
+
+    def download_chapter(self, manga_folder, volume, chapter, chapter_id):
+        if not self.control.wait_if_paused():
+            return False
+        self.logger_callback(f"Downloading volume {volume}, chapter {chapter}...")
+
+        images = self.fetch_images(chapter_id)
+        if images:
+            chapter_folder = self.chapter_folder(manga_folder, volume, chapter)
+            os.makedirs(chapter_folder, exist_ok=True)
+
+            # số ảnh tải song song do AdaptiveConcurrency giới hạn theo host của CDN
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency.ceiling) as executor:
+                list(executor.map(lambda image_url: self.download_image(image_url, chapter_folder), images))
+            self.logger_callback(f"Finished chapter {chapter} (concurrency limits: {self.concurrency.describe()})")
+        else:
+            self.logger_callback(f"No images found for chapter {chapter}.")
+        return self.control.is_running
+
+    def load_sync_state(self):
+        """{"last_sync": {manga_id: thời điểm}, "chapters": {manga_id: {"volume/chapter": bản dịch đã tải}}}"""
+        try:
+            with open(self.sync_state_file, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+
+        if 'last_sync' not in state:
+            # định dạng cũ chỉ lưu {manga_id: thời điểm}
+            state = {'last_sync': state, 'chapters': {}}
+        state.setdefault('chapters', {})
+        return state
+
+    def save_sync_state(self, state):
+        with open(self.sync_state_file, 'w') as f:
+            json.dump(state, f, indent=2)
 
-        for volume, chapter, chapter_id in chapters:
-            self.logger_callback(f"Downloading volume {volume}, chapter {chapter}...")
+    def fetch_updates(self, manga_ids, last_sync):
+        """Gom chapter mới của cả danh sách manga với càng ít request càng tốt.
 
-            images = self.fetch_images(chapter_id)
-            if images:
-                chapter_folder = os.path.join(manga_folder, f"volume_{volume}", f"chapter_{chapter}")
-                os.makedirs(chapter_folder, exist_ok=True)
+        Manga đã sync gần đây được lấy chung qua feed /chapter toàn site (lọc updatedAtSince),
+        manga mới hoặc đã lâu chưa sync thì dùng feed /manga/{id}/feed riêng.
+        """
+        oldest_allowed = (datetime.now(timezone.utc) - self.global_feed_window).strftime('%Y-%m-%dT%H:%M:%S')
+        recent = {manga_id for manga_id in manga_ids if last_sync.get(manga_id, '') >= oldest_allowed}
+        entries = []
+        failed = set()
 
-                for image_url in images:
-                    self.download_image(image_url, chapter_folder)
+        if recent:
+            since = min(last_sync[manga_id] for manga_id in recent)
+            self.logger_callback(f"Checking {len(recent)} manga updated since {since}...")
+            items = self.fetch_feed("/chapter", {}, since=since)
+            if items is None:
+                failed |= recent
+            for item in items or []:
+                entry = self.chapter_entry(item)
+                if entry['manga_id'] in recent and entry['updated_at'] > last_sync[entry['manga_id']]:
+                    entries.append(entry)
+
+        for manga_id in manga_ids:
+            if manga_id in recent:
+                continue
+            if not self.control.is_running:
+                break
+            items = self.fetch_feed(f"/manga/{manga_id}/feed", {}, since=last_sync.get(manga_id))
+            if items is None:
+                failed.add(manga_id)
+            for item in items or []:
+                entry = self.chapter_entry(item)
+                entry['manga_id'] = manga_id
+                entries.append(entry)
+
+        return self.select_chapters(entries), failed
+
+    def sync_follow_list(self, manga_ids):
+        if not manga_ids:
+            self.logger_callback("No manga ids to sync.")
+            return
+
+        sync_started = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+        state = self.load_sync_state()
+        titles, missing = self.fetch_manga_titles(manga_ids)
+        for manga_id in missing:
+            self.logger_callback(f"Manga not found: {manga_id}")
+        manga_ids = [manga_id for manga_id in manga_ids if manga_id not in missing]
+
+        chapters, failed = self.fetch_updates(manga_ids, state['last_sync'])
+        self.logger_callback(f"Found {len(chapters)} new chapters in {len(manga_ids)} manga.")
+
+        unsynced = []
+        chapters_by_manga = {}
+        for entry in chapters:
+            chapters_by_manga.setdefault(entry['manga_id'], []).append(entry)
+
+        for manga_id in manga_ids:
+            if not self.control.is_running:
+                break
+
+            entries = chapters_by_manga.get(manga_id, [])
+            failed_images = self.failed_images
+            if entries:
+                self.logger_callback(f"Syncing {titles[manga_id]} ({len(entries)} chapters)")
+                manga_folder = self.create_manga_folder(manga_id)
+                completed = all(
+                    self.download_chapter(manga_folder, entry['volume'], entry['chapter'], entry['id'])
+                    for entry in entries
+                    if self.claim_chapter(state, entry, manga_folder)
+                )
+                self.save_sync_state(state)
+                if not completed:
+                    break
+
+            # chỉ dời mốc sync khi không có lỗi, để lần sau lấy lại chapter bị thiếu
+            if manga_id not in failed and self.failed_images == failed_images:
+                state['last_sync'][manga_id] = sync_started
+                self.save_sync_state(state)
             else:
-                self.logger_callback(f"No images found for chapter {chapter}.")
+                unsynced.append(manga_id)
 
-        self.logger_callback(f"Download completed for manga: {manga_id}")
+        if self.control.is_running and unsynced:
+            self.logger_callback(f"Sync finished with errors, {len(unsynced)} manga will be checked again next time.")
+        elif self.control.is_running:
+            self.logger_callback(f"Sync completed for {len(manga_ids)} manga.")
+        else:
+            self.logger_callback("Sync stopped, unfinished manga will be checked again next time.")
 
     def download_image(self, image_url, save_folder):
+        image_name = os.path.basename(image_url)
+        image_path = os.path.join(save_folder, image_name)
+        if os.path.exists(image_path):
+            return
+
         try:
-            response = requests.get(image_url)
-            if response.status_code == 200:
-                image_name = os.path.basename(image_url)
-                image_path = os.path.join(save_folder, image_name)
-                
-                with open(image_path, 'wb') as f:
-                    f.write(response.content)
+            while self.control.wait_if_paused():
+                with self.concurrency.slot(image_url) as slot:
+                    started = time.monotonic()
+                    try:
+                        response = requests.get(image_url, headers=resume_headers(image_path), stream=True, timeout=30)
+                    except requests.exceptions.RequestException:
+                        slot.record(time.monotonic() - started, error=True)
+                        raise
+                    slot.record(time.monotonic() - started, response.status_code)
 
-                self.logger_callback(f"Downloaded image: {image_name}")
-            else:
-                self.logger_callback(f"Failed to download image from {image_url}. Status code: {response.status_code}")
+                    if response.status_code not in (200, 206, 416):
+                        response.close()
+                        self.mark_image_failed()
+                        self.logger_callback(f"Failed to download image from {image_url}. Status code: {response.status_code}")
+                        return
+
+                    if write_stream(response, image_path, self.control):
+                        self.logger_callback(f"Downloaded image: {image_name}")
+                        return
         except Exception as e:
-            self.logger_callback(f"Error downloading image: {e}")
\ No newline at end of file
+            self.mark_image_failed()
+            self.logger_callback(f"Error downloading image: {e}")
+
+    def mark_image_failed(self):
+        with self.lock:
+            self.failed_images += 1
\ No newline at end of file
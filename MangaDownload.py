@@ -1,8 +1,7 @@
 import os
 import requests
 import cloudscraper
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 import concurrent.futures
 import time
 import re
@@ -14,6 +13,11 @@ from threading import Lock
 import fake_useragent
 from datetime import datetime
 
+from download_control import DownloadControl, resume_headers, write_stream
+from concurrency import AdaptiveConcurrency
+from bandwidth import bandwidth
+from parsing import run_parser, parse_manga_page, parse_chapter_page
+
 class MangaDownloader:
     def __init__(self, logger_callback=None):
         self.image_select = "img.lozad" # mac dinh la nettruyen :3
@@ -23,7 +27,8 @@ class MangaDownloader:
         self.download_queue = Queue()
         self.failed_queue = Queue()
         self.lock = Lock()
-        self.is_running = True
+        self.control = DownloadControl()
+        self.concurrency = AdaptiveConcurrency(logger_callback=self.logger.info)
         self.executor = None 
         
         self.user_agents = [
@@ -44,10 +49,22 @@ class MangaDownloader:
             }
         )
 
+    @property
+    def is_running(self):
+        return self.control.is_running
+
     def stop(self):
-        self.is_running = False
+        self.control.stop()
         if self.executor:
-            self.executor.shutdown(wait=False) 
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def pause(self):
+        self.control.pause()
+        self.logger.info("Paused, waiting for in-flight downloads to checkpoint...")
+
+    def resume(self):
+        self.control.resume()
+        self.logger.info("Resumed")
 
     def setup_website(self, option: str): 
         if(option == 'Nettruyen'):
@@ -56,6 +73,9 @@ class MangaDownloader:
         if(option == 'TruyenQQ'):
             self.image_select = "img.lazy"
             self.chapters_select = "div.works-chapter-list a[href]"
+
+    def setup_concurrency(self, floor: int, ceiling: int):
+        self.concurrency.setup(floor, ceiling)
         
         
     def setup_logging(self, callback=None):
@@ -118,38 +138,64 @@ class MangaDownloader:
     def get_proxy(self):
         return random.choice(self.proxies) if self.proxies else None
 
-    def download_with_retry(self, url, headers=None, is_image=False, max_retries=5, initial_delay=3):
+    def download_with_retry(self, url, headers=None, is_image=False, max_retries=5, initial_delay=3, stream=False,
+                            handle_response=None, resume_path=None):
+        # handle_response (nếu có) được gọi với response trong lúc còn giữ slot của host,
+        # dùng để đọc body dạng stream mà vẫn được tính là một request đang chạy.
+        # resume_path (nếu có): mỗi lần thử tính lại Range theo file .part hiện tại,
+        # vì lần thử trước có thể đã ghi thêm dữ liệu trước khi mất kết nối
         if headers is None:
             headers = self.get_headers()
+        base_headers = headers
 
-        response = None
         for attempt in range(max_retries):
+            response = None
+            if resume_path:
+                headers = resume_headers(resume_path, base_headers)
+            # Stop phải có tác dụng ngay cả khi đang retry, không ngủ hết các lần chờ
+            if not self.control.sleep(initial_delay + random.uniform(1, 3)):
+                return None
             try:
-                time.sleep(initial_delay + random.uniform(1, 3))
                 
                 proxy = self.get_proxy()
-                
-                if is_image:
-                    response = requests.get(
-                        url,
-                        headers=headers,
-                        proxies={'http': proxy, 'https': proxy} if proxy else None,
-                        timeout=30,
-                        cookies=self.cookies
-                    )
-                else:
-                    response = self.scraper.get(
-                        url,
-                        headers=headers,
-                        proxies={'http': proxy, 'https': proxy} if proxy else None,
-                        cookies=self.cookies
-                    )
 
-                response.raise_for_status()
-                
-                self.cookies.update(response.cookies.get_dict())
-                
-                return response
+                # chỉ giữ slot trong lúc request và đọc body, không giữ trong lúc ngủ chờ
+                with self.concurrency.slot(url) as slot:
+                    started = time.monotonic()
+                    try:
+                        if is_image:
+                            response = requests.get(
+                                url,
+                                headers=headers,
+                                proxies={'http': proxy, 'https': proxy} if proxy else None,
+                                timeout=30,
+                                cookies=self.cookies,
+                                stream=stream
+                            )
+                        else:
+                            response = self.scraper.get(
+                                url,
+                                headers=headers,
+                                proxies={'http': proxy, 'https': proxy} if proxy else None,
+                                cookies=self.cookies
+                            )
+                    except requests.exceptions.RequestException:
+                        slot.record(time.monotonic() - started, error=True)
+                        raise
+
+                    slot.record(time.monotonic() - started, response.status_code)
+
+                    # 416 khi gửi Range nghĩa là file .part đã đủ, write_stream sẽ xử lý
+                    if not (response.status_code == 416 and 'Range' in headers):
+                        response.raise_for_status()
+                    
+                    if not stream:
+                        # body đã được tải hết ở đây, chỉ có thể bù thời gian sau khi đọc
+                        bandwidth.throttle_read(url, len(response.content), self.control)
+
+                    self.cookies.update(response.cookies.get_dict())
+                    
+                    return handle_response(response) if handle_response else response
 
             except requests.exceptions.RequestException as e:
                 self.logger.error(f"Attempt {attempt + 1} failed for {url}: {str(e)}")
@@ -157,10 +203,11 @@ class MangaDownloader:
                 if attempt == max_retries - 1:
                     raise
                 
-                if response and response.status_code == 429:
+                if response is not None and response.status_code == 429:
                     wait_time = initial_delay * (2 ** attempt)
                     self.logger.warning(f"Rate limited, waiting {wait_time}s...")
-                    time.sleep(wait_time)
+                    if not self.control.sleep(wait_time):
+                        return None
                     
                 if proxy and self.proxies:
                     self.proxies.remove(proxy)
@@ -185,19 +232,26 @@ class MangaDownloader:
         })
         
         try:
-            response = self.download_with_retry(img_url, headers, is_image=True)
-            if response:
-                with open(save_path, 'wb') as f:
-                    f.write(response.content)
-                self.logger.info(f"Downloaded: {os.path.basename(save_path)}")
-                return True
+            while self.control.wait_if_paused():
+                completed = self.download_with_retry(
+                    img_url, headers, is_image=True, stream=True,
+                    handle_response=lambda response: write_stream(response, save_path, self.control),
+                    resume_path=save_path
+                )
+                if completed is None:
+                    return False
+                if completed:
+                    self.logger.info(f"Downloaded: {os.path.basename(save_path)}")
+                    return True
+                # bị tạm dừng giữa chừng: phần đã tải nằm trong file .part, chờ resume rồi tải tiếp
+            return False
         except Exception as e:
             self.logger.error(f"Error downloading {img_url}: {str(e)}")
             self.failed_queue.put((img_url, referer, save_path))
             return False
 
     def process_chapter(self, chapter_url, manga_folder):
-        if not self.is_running:
+        if not self.control.wait_if_paused():
             return
 
         if chapter_url in self.progress and self.progress[chapter_url] == 'completed':
@@ -209,28 +263,24 @@ class MangaDownloader:
             if not response:
                 return
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            chapter_name = soup.select_one('h1') or urlparse(chapter_url).path.split('/')[-1]
-            chapter_name = str(chapter_name.text if hasattr(chapter_name, 'text') else chapter_name)
+            chapter_name, images = run_parser(
+                parse_chapter_page, response.content, response.encoding, chapter_url, self.image_select
+            )
             chapter_name = self.sanitize_filename(chapter_name)
             
             chapter_folder = os.path.join(manga_folder, chapter_name)
             os.makedirs(chapter_folder, exist_ok=True)
             
-            images = soup.select(self.image_select)
             total_images = len(images)
             downloaded_images = 0
             
-            for idx, img in enumerate(images, 1):
-                if not self.is_running:
+            for idx, img_url in enumerate(images, 1):
+                if not self.control.wait_if_paused():
                     return
                 
-                img_url = img.get('src') or img.get('data-src')
                 if not img_url:
                     continue
                     
-                img_url = urljoin(chapter_url, img_url)
                 file_ext = os.path.splitext(urlparse(img_url).path)[1] or '.jpg'
                 save_path = os.path.join(chapter_folder, f"{idx:03d}{file_ext}")
                 
@@ -241,11 +291,11 @@ class MangaDownloader:
                 if self.download_image(img_url, chapter_url, save_path):
                     downloaded_images += 1
                 
-                time.sleep(random.uniform(0.5, 1.5))
+                self.control.sleep(random.uniform(0.5, 1.5))
             
             if downloaded_images == total_images:
                 self.save_progress(chapter_url, 'completed')
-                self.logger.info(f"Completed chapter: {chapter_name}")
+                self.logger.info(f"Completed chapter: {chapter_name} (concurrency limits: {self.concurrency.describe()})")
             else:
                 self.save_progress(chapter_url, 'incomplete')
                 self.logger.warning(f"Incomplete chapter: {chapter_name} ({downloaded_images}/{total_images})")
@@ -273,17 +323,15 @@ class MangaDownloader:
     def download_manga(self, manga_url):
         print(manga_url + "\n\n")
         try:
-            self.is_running = True 
             self.logger.info(f"Starting download from: {manga_url}")
             
             response = self.download_with_retry(manga_url)
             if not response:
                 return
                 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            manga_name = soup.select_one('h1[itemprop="name"]')
-            manga_name = manga_name.text if manga_name else "manga"
+            manga_name, chapter_urls = run_parser(
+                parse_manga_page, response.content, response.encoding, manga_url, self.chapters_select
+            )
             manga_name = self.sanitize_filename(manga_name)
             manga_folder = os.path.join(os.getcwd(), manga_name)
             # os.makedirs(manga_folder, exist_ok=True)
@@ -293,14 +341,12 @@ class MangaDownloader:
             except PermissionError:
                 self.logger.error(f"Permission denied when creating directory: {manga_folder}")
             
-            chapters = soup.select(self.chapters_select)
-            chapter_urls = [urljoin(manga_url, chapter.get('href')) for chapter in chapters]
-            
-            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            # số luồng chỉ là trần, số request thực sự chạy song song do AdaptiveConcurrency quyết định theo từng host
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency.ceiling) as executor:
                 self.executor = executor 
                 futures = []
                 for chapter_url in chapter_urls:
-                    if not self.is_running:
+                    if not self.control.wait_if_paused():
                         break
                     futures.append(
                         executor.submit(self.process_chapter, chapter_url, manga_folder)
@@ -0,0 +1,14 @@
+import os
+import sys
+
+
+def app_dir():
+    """Thư mục chứa app: cạnh file exe khi đóng gói bằng PyInstaller, cạnh main.py khi chạy từ source."""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(os.path.abspath(sys.executable))
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def config_path(filename):
+    # đường dẫn tuyệt đối vì DownloaderThread đổi thư mục làm việc sang thư mục lưu truyện
+    return os.path.join(app_dir(), filename)
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+from datetime import datetime
+from threading import Lock
+from urllib.parse import urlparse
+
+from app_config import config_path
+
+CONFIG_FILE = config_path('bandwidth.json')
+
+DEFAULT_SETTINGS = {
+    'total': 0,      # bytes/s cho toàn bộ lượt tải, 0 = không giới hạn
+    'per_host': 0,   # bytes/s cho mỗi host
+    'disk_write': 0, # bytes/s ghi xuống ổ đĩa
+}
+
+WAIT_SLICE = 0.25 # giây, khoảng kiểm tra lại rate / Pause / Stop khi đang bị giới hạn
+
+
+class TokenBucket:
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            if rate != self.rate:
+                self.rate = rate
+                self.tokens = min(max(self.tokens, 0), rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        with self.lock:
+            if not self.rate:
+                return 0
+            self._refill()
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def consume(self, amount, control=None, on_wait=None):
+        """Lấy `amount` token, ngủ nếu đang nợ. Trả về False nếu bị tạm dừng / dừng giữa chừng.
+
+        Ngủ từng đoạn ngắn để đổi rate (set_rate hoặc `on_wait` nạp lại cấu hình),
+        Pause và Stop có hiệu lực ngay thay vì phải chờ hết khoản nợ.
+        """
+        with self.lock:
+            if not self.rate:
+                return True
+            # dung lượng bucket = 1 giây, chunk lớn hơn thì cho nợ rồi ngủ để trả
+            self._refill()
+            self.tokens -= amount
+
+        delay = self.wait_time()
+        while delay > 0:
+            if control is None:
+                time.sleep(min(delay, WAIT_SLICE))
+            elif not control.sleep(min(delay, WAIT_SLICE)) or control.should_checkpoint():
+                return False
+            if on_wait:
+                on_wait()
+            delay = self.wait_time()
+        return True
+
+
+class BandwidthLimiter:
+    """Giới hạn tốc độ tải (tổng và theo host) và tốc độ ghi đĩa cho mọi downloader.
+
+    Cấu hình đọc từ bandwidth.json và được nạp lại khi file thay đổi, ví dụ:
+
+        {"total": 0, "per_host": 0, "disk_write": 0,
+         "schedule": [{"start": "08:00", "end": "23:00", "total": 1000000, "per_host": 300000}]}
+
+    Mục nào trong schedule khớp giờ hiện tại sẽ ghi đè các giá trị mặc định.
+    """
+
+    def __init__(self, config_file=CONFIG_FILE, reload_interval=5):
+        self.config_file = config_file
+        self.reload_interval = reload_interval
+        self.config = dict(DEFAULT_SETTINGS)
+        self.config_mtime = None
+        self.checked = 0.0
+        self.lock = Lock()
+
+        self.total_bucket = TokenBucket()
+        self.disk_bucket = TokenBucket()
+        self.host_buckets = {}
+        self.per_host_rate = 0
+
+    def load_config(self):
+        try:
+            mtime = os.path.getmtime(self.config_file)
+        except OSError:
+            self.config, self.config_mtime = dict(DEFAULT_SETTINGS), None
+            return
+
+        if mtime == self.config_mtime:
+            return
+        try:
+            with open(self.config_file, 'r') as f:
+                self.config = {**DEFAULT_SETTINGS, **json.load(f)}
+            self.config_mtime = mtime
+        except (OSError, ValueError):
+            pass # giữ cấu hình cũ nếu file đang được sửa dở
+
+    def active_settings(self, now=None):
+        now = now or datetime.now()
+        settings = {key: self.config.get(key, 0) for key in DEFAULT_SETTINGS}
+        current = now.strftime('%H:%M')
+        for entry in self.config.get('schedule', []):
+            start, end = entry.get('start', '00:00'), entry.get('end', '24:00')
+            in_window = start <= current < end if start <= end else (current >= start or current < end)
+            if in_window:
+                settings.update({key: entry[key] for key in DEFAULT_SETTINGS if key in entry})
+                break
+        return settings
+
+    def refresh(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.checked < self.reload_interval:
+                return
+            self.checked = now
+            self.load_config()
+            settings = self.active_settings()
+
+            self.total_bucket.set_rate(settings['total'])
+            self.disk_bucket.set_rate(settings['disk_write'])
+            self.per_host_rate = settings['per_host']
+            for bucket in self.host_buckets.values():
+                bucket.set_rate(self.per_host_rate)
+
+    def host_bucket(self, host):
+        with self.lock:
+            if host not in self.host_buckets:
+                self.host_buckets[host] = TokenBucket(self.per_host_rate)
+            return self.host_buckets[host]
+
+    def throttle_read(self, url, amount, control=None):
+        """Trả về False nếu `control` bị tạm dừng / dừng trong lúc chờ."""
+        self.refresh()
+        return (
+            self.host_bucket(urlparse(url).netloc).consume(amount, control, self.refresh)
+            and self.total_bucket.consume(amount, control, self.refresh)
+        )
+
+    def throttle_write(self, amount, control=None):
+        self.refresh()
+        return self.disk_bucket.consume(amount, control, self.refresh)
+
+    def read_content(self, response, chunk_size=64 * 1024, control=None):
+        """Đọc hết body của response (stream=True) theo giới hạn băng thông.
+
+        Trả về None nếu `control` bị dừng giữa chừng.
+        """
+        chunks = []
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not self.throttle_read(response.url, len(chunk), control) and not control.wait_if_paused():
+                    return None
+                chunks.append(chunk)
+        finally:
+            response.close()
+        return b"".join(chunks)
+
+
+bandwidth = BandwidthLimiter()
@@ -0,0 +1,144 @@
+"""So sánh tốc độ parse HTML: parse ngay trên thread tải (cũ) và gửi sang process pool (parsing.py).
+
+Chạy: python bench_parsing.py [số trang mỗi lần đo]
+Dùng HTML giả lập giống trang chapter Nettruyen và trang chapter hako, không cần mạng.
+Mỗi lần đo có các "thread mạng" đọc dữ liệu qua socket song song (giống các thread đang
+tải ảnh), để thấy việc parse trên thread tải làm chậm I/O vì tranh GIL.
+"""
+import sys
+import time
+import socket
+import threading
+import concurrent.futures
+
+from parsing import run_parser, parse_chapter_page, parse_novel_chapter
+
+WORKER_COUNTS = [2, 8, 32]
+
+
+def fake_chapter_page(images=60, filler=2000):
+    comments = "".join(
+        f'<div class="comment"><p>comment {i}</p><a href="/u/{i}">user {i}</a></div>' for i in range(filler)
+    )
+    imgs = "".join(
+        f'<div class="page-chapter"><img class="lozad" data-src="//cdn.example.com/{i}.jpg" alt="page {i}"></div>'
+        for i in range(images)
+    )
+    return f"<html><body><h1>Chapter 1</h1>{imgs}{comments}</body></html>".encode('utf-8')
+
+
+def fake_novel_chapter(paragraphs=1500):
+    body = "".join(f'<p id="{i}">Đoạn văn số {i} của chapter, ' + "chữ " * 40 + "</p>" for i in range(paragraphs))
+    return f'<html><body><div id="chapter-content">{body}</div></body></html>'.encode('utf-8')
+
+
+def parse_in_thread(parser, *args):
+    return parser(*args)
+
+
+def parse_in_pool(parser, *args):
+    return run_parser(parser, *args)
+
+
+class SocketTraffic:
+    """Các cặp thread gửi / nhận qua socketpair, đếm số byte nhận được.
+
+    Bên gửi phát đều 16 KB mỗi `interval` giây như một kết nối mạng thật (không chiếm hết CPU),
+    nên I/O nhận được thấp hơn mức phát là do thread nhận phải chờ GIL.
+    """
+
+    def __init__(self, streams, chunk=b"x" * 16384, interval=0.005):
+        self.streams = streams
+        self.chunk = chunk
+        self.interval = interval
+        self.received = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.threads = []
+        self.sockets = []
+
+    def sender(self, sock):
+        try:
+            while not self.stopped.is_set():
+                sock.sendall(self.chunk)
+                time.sleep(self.interval)
+        except OSError:
+            pass
+
+    def receiver(self, sock):
+        received = 0
+        try:
+            while not self.stopped.is_set():
+                data = sock.recv(65536)
+                if not data:
+                    break
+                received += len(data)
+        except OSError:
+            pass
+        with self.lock:
+            self.received += received
+
+    def __enter__(self):
+        for _ in range(self.streams):
+            send_sock, recv_sock = socket.socketpair()
+            self.sockets += [send_sock, recv_sock]
+            self.threads += [
+                threading.Thread(target=self.sender, args=(send_sock,), daemon=True),
+                threading.Thread(target=self.receiver, args=(recv_sock,), daemon=True),
+            ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        for sock in self.sockets:
+            sock.close()
+        for thread in self.threads:
+            thread.join()
+
+
+def measure(runner, workers, jobs):
+    """Trả về (trang/giây, MB/giây của I/O socket chạy song song)."""
+    with SocketTraffic(workers) as traffic:
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda job: runner(*job), jobs))
+        elapsed = time.perf_counter() - started
+    return len(jobs) / elapsed, traffic.received / elapsed / 1e6
+
+
+def offered_io(workers):
+    traffic = SocketTraffic(workers)
+    return workers * len(traffic.chunk) / traffic.interval / 1e6
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    chapter_html = fake_chapter_page()
+    novel_html = fake_novel_chapter()
+    cases = {
+        'manga chapter': (parse_chapter_page, chapter_html, 'utf-8', 'https://nettruyen.example/chap-1', 'img.lozad'),
+        'novel chapter': (parse_novel_chapter, novel_html, 'utf-8'),
+    }
+
+    run_parser(parse_novel_chapter, b"<p id='1'>warm up</p>", 'utf-8') # khởi động process pool trước khi đo
+
+    print("I/O columns: MB/s the simulated network threads received while parsing ran.")
+    print(
+        f"{'page type':<15}{'workers':>8}{'offered I/O':>12}{'thread pages/s':>16}{'thread I/O MB/s':>17}"
+        f"{'process pages/s':>17}{'process I/O MB/s':>18}"
+    )
+    for name, job in cases.items():
+        jobs = [job] * pages
+        for workers in WORKER_COUNTS:
+            thread_pages, thread_io = measure(parse_in_thread, workers, jobs)
+            pool_pages, pool_io = measure(parse_in_pool, workers, jobs)
+            print(
+                f"{name:<15}{workers:>8}{offered_io(workers):>12.1f}{thread_pages:>16.1f}{thread_io:>17.1f}"
+                f"{pool_pages:>17.1f}{pool_io:>18.1f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
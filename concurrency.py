@@ -0,0 +1,156 @@
+import json
+import time
+from contextlib import contextmanager
+from threading import Condition, Lock
+from urllib.parse import urlparse
+
+from app_config import config_path
+
+CONFIG_FILE = config_path('concurrency.json')
+DEFAULT_FLOOR = 1
+DEFAULT_CEILING = 8
+
+
+def validate_limits(floor, ceiling):
+    # floor < 1 có thể làm limit về 0 và mọi thread chờ slot mãi mãi
+    if not (isinstance(floor, int) and isinstance(ceiling, int) and 1 <= floor <= ceiling):
+        raise ValueError(f"Concurrency limits must satisfy 1 <= floor <= ceiling, got floor={floor}, ceiling={ceiling}")
+
+
+def load_limits(config_file=CONFIG_FILE):
+    """Đọc floor / ceiling từ concurrency.json, ví dụ {"floor": 1, "ceiling": 8}."""
+    try:
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = {}
+
+    floor = config.get('floor', DEFAULT_FLOOR)
+    ceiling = config.get('ceiling', DEFAULT_CEILING)
+    validate_limits(floor, ceiling)
+    return floor, ceiling
+
+
+class RequestSlot:
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def record(self, elapsed, status_code=None, error=False):
+        """Ghi kết quả một lần request: timeout / lỗi kết nối, 429 và 5xx làm giảm limit."""
+        if error or status_code == 429 or (status_code is not None and status_code >= 500):
+            self.limiter.on_failure()
+        elif status_code is None or status_code < 400 or status_code == 416:
+            self.limiter.on_success(elapsed)
+
+
+class AdaptiveLimiter:
+    """Giới hạn số request đồng thời tới một host theo kiểu AIMD.
+
+    Mỗi khi đủ `limit` request thành công với độ trễ bình thường thì limit tăng thêm 1,
+    gặp timeout / 429 / 5xx thì limit bị nhân với decrease_factor (không thấp hơn floor).
+    """
+
+    def __init__(self, host, floor=DEFAULT_FLOOR, ceiling=DEFAULT_CEILING, initial=2, logger_callback=None,
+                 latency_factor=2.0, max_error_rate=0.1, decrease_factor=0.5):
+        validate_limits(floor, ceiling)
+        self.host = host
+        self.floor = floor
+        self.ceiling = ceiling
+        self.limit = float(max(floor, min(initial, ceiling)))
+        self.logger_callback = logger_callback
+        self.latency_factor = latency_factor
+        self.max_error_rate = max_error_rate
+        self.decrease_factor = decrease_factor
+
+        self.in_flight = 0
+        self.avg_latency = None
+        self.error_rate = 0.0
+        self.last_decrease = 0.0
+        self.condition = Condition()
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    @contextmanager
+    def slot(self):
+        with self.condition:
+            while self.in_flight >= self.current_limit:
+                self.condition.wait()
+            self.in_flight += 1
+        try:
+            yield RequestSlot(self)
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
+
+    def on_success(self, elapsed):
+        with self.condition:
+            old_limit = self.current_limit
+            self.error_rate *= 0.9
+
+            healthy = self.avg_latency is None or elapsed <= self.avg_latency * self.latency_factor
+            self.avg_latency = elapsed if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * elapsed
+
+            if healthy and self.error_rate <= self.max_error_rate:
+                self.limit = min(self.ceiling, self.limit + 1 / self.limit)
+            self.log_change(old_limit)
+            self.condition.notify_all()
+
+    def on_failure(self):
+        with self.condition:
+            old_limit = self.current_limit
+            self.error_rate = 0.9 * self.error_rate + 0.1
+
+            # các request đang chạy thường lỗi cùng lúc: chỉ giảm một lần cho mỗi vòng trễ
+            now = time.monotonic()
+            if now - self.last_decrease >= (self.avg_latency or 1.0):
+                self.last_decrease = now
+                self.limit = max(self.floor, self.limit * self.decrease_factor)
+            self.log_change(old_limit)
+
+    def log_change(self, old_limit):
+        if self.logger_callback and self.current_limit != old_limit:
+            self.logger_callback(f"[{self.host}] concurrency limit {old_limit} -> {self.current_limit}")
+
+
+class AdaptiveConcurrency:
+    """Quản lý một AdaptiveLimiter riêng cho mỗi host."""
+
+    def __init__(self, floor=DEFAULT_FLOOR, ceiling=DEFAULT_CEILING, initial=2, logger_callback=None):
+        validate_limits(floor, ceiling)
+        self.floor = floor
+        self.ceiling = ceiling
+        self.initial = initial
+        self.logger_callback = logger_callback
+        self.limiters = {}
+        self.lock = Lock()
+
+    def setup(self, floor, ceiling):
+        validate_limits(floor, ceiling)
+        with self.lock:
+            self.floor = floor
+            self.ceiling = ceiling
+            for limiter in self.limiters.values():
+                with limiter.condition:
+                    limiter.floor = floor
+                    limiter.ceiling = ceiling
+                    limiter.limit = float(max(floor, min(limiter.limit, ceiling)))
+                    limiter.condition.notify_all()
+
+    def for_url(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = AdaptiveLimiter(
+                    host, self.floor, self.ceiling, self.initial, self.logger_callback
+                )
+            return self.limiters[host]
+
+    def slot(self, url):
+        return self.for_url(url).slot()
+
+    def describe(self):
+        with self.lock:
+            return ", ".join(f"{host}: {limiter.current_limit}" for host, limiter in self.limiters.items())
@@ -0,0 +1,127 @@
+import os
+import re
+from threading import Event
+
+from bandwidth import bandwidth
+
+PART_SUFFIX = ".part"
+
+
+class DownloadControl:
+    """Trạng thái chạy / tạm dừng dùng chung giữa GUI và các downloader.
+
+    Mỗi lượt tải dùng một DownloadControl riêng: đã stop thì không chạy lại được,
+    để lệnh Stop bấm sớm không bị lượt tải vừa bắt đầu ghi đè.
+    """
+
+    def __init__(self):
+        self._resume_event = Event()
+        self._resume_event.set()
+        self._stop_event = Event()
+
+    @property
+    def is_running(self):
+        return not self._stop_event.is_set()
+
+    @property
+    def is_paused(self):
+        return not self._resume_event.is_set()
+
+    def pause(self):
+        self._resume_event.clear()
+
+    def resume(self):
+        self._resume_event.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._resume_event.set()  # đánh thức các thread đang chờ để chúng thoát
+
+    def wait_if_paused(self):
+        self._resume_event.wait()
+        return self.is_running
+
+    def sleep(self, seconds):
+        """Ngủ nhưng thức dậy ngay khi bị stop. Trả về False nếu đã bị stop."""
+        self._stop_event.wait(seconds)
+        return self.is_running
+
+    def should_checkpoint(self):
+        return self.is_paused or not self.is_running
+
+
+def part_path(save_path):
+    return save_path + PART_SUFFIX
+
+
+def resume_headers(save_path, headers=None):
+    headers = dict(headers or {})
+    offset = os.path.getsize(part_path(save_path)) if os.path.exists(part_path(save_path)) else 0
+    if offset:
+        headers['Range'] = f"bytes={offset}-"
+    else:
+        headers.pop('Range', None)
+    return headers
+
+
+def _content_range(response):
+    """Trả về (start, end, total) từ header Content-Range, phần không có là None."""
+    match = re.match(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)", response.headers.get('Content-Range', ''))
+    if not match:
+        return None, None, None
+    start, end, total = match.groups()
+    return (
+        int(start) if start is not None else None,
+        int(end) if end is not None else None,
+        int(total) if total and total != '*' else None,
+    )
+
+
+def write_stream(response, save_path, control, chunk_size=64 * 1024):
+    """Ghi response (stream=True) vào file .part rồi đổi tên khi xong.
+
+    Trả về True nếu file đã hoàn tất. Trả về False nếu cần gọi lại: bị tạm dừng / dừng
+    giữa chừng (phần đã tải giữ trong .part để tiếp tục bằng Range), hoặc file .part
+    không khớp với server nên đã bị xoá để tải lại từ đầu.
+    """
+    part = part_path(save_path)
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+
+    try:
+        if response.status_code == 416 and offset:
+            # server báo Range vượt quá kích thước: chỉ nhận .part nếu đúng bằng kích thước file
+            _, _, total = _content_range(response)
+            if total == offset:
+                os.replace(part, save_path)
+                return True
+            os.remove(part)
+            return False
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            start, end, total = _content_range(response)
+            if start != offset or (total is not None and end + 1 != total):
+                # 206 không nối tiếp được .part (hoặc chỉ là một đoạn giữa file): không bao giờ ghi như file đầy đủ
+                if not offset:
+                    raise IOError(f"Unexpected partial response for {response.url}: {response.headers.get('Content-Range')}")
+                os.remove(part)
+                return False
+            mode = 'ab'
+        else:
+            # server không hỗ trợ Range -> tải lại từ đầu
+            mode = 'wb'
+
+        with open(part, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if control.should_checkpoint():
+                    return False
+                if chunk:
+                    # chunk đã nhận thì vẫn ghi, Pause / Stop trong lúc chờ được xử lý ở vòng sau
+                    bandwidth.throttle_read(response.url, len(chunk), control)
+                    bandwidth.throttle_write(len(chunk), control)
+                    f.write(chunk)
+    finally:
+        response.close()
+
+    os.replace(part, save_path)
+    return True
@@ -1,16 +1,38 @@
-from bs4 import BeautifulSoup
 import re
 import requests
 import os
+import time
+import concurrent.futures
+
+from download_control import DownloadControl
+from concurrency import AdaptiveConcurrency
+from bandwidth import bandwidth
+from parsing import run_parser, parse_novel_index, parse_novel_chapter
 
 class LightNovel:
     def __init__(self, logger_callback=None):
         self.logger_callback = logger_callback or print
         self.domain = "ln.hako.vn"
+        self.control = DownloadControl()
+        self.concurrency = AdaptiveConcurrency(logger_callback=self.logger_callback)
 
     def setup_domain(self, domain):
         self.domain = domain
 
+    def setup_concurrency(self, floor: int, ceiling: int):
+        self.concurrency.setup(floor, ceiling)
+
+    def stop(self):
+        self.control.stop()
+
+    def pause(self):
+        self.control.pause()
+        self.logger_callback("Paused after the current chapters...")
+
+    def resume(self):
+        self.control.resume()
+        self.logger_callback("Resumed")
+
     def download_lightNovel(self, light_novel_url):
         print(self.domain)
         ln_folder = os.path.join(os.getcwd(), "LightNovel")
@@ -21,34 +43,73 @@ class LightNovel:
         except PermissionError:
             self.logger_callback(f"Permission denied when creating directory: {ln_folder}")
 
-        response = requests.get(light_novel_url)
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        list_items = soup.find_all(class_='chapter-name')
+        response = requests.get(light_novel_url, stream=True)
+        index_content = bandwidth.read_content(response, control=self.control)
+        if index_content is None:
+            self.logger_callback("Download stopped by user")
+            return
+        list_items = run_parser(parse_novel_index, index_content, response.encoding)
 
+        chapters = []
         for item in list_items:
-            link = item.find('a')
-            if link:
-                title = link.get('title')
+            if item:
+                title, href = item
                 title = re.sub(r'[\/:*?"<>|]', '', title) 
+                chapters.append((title, f"https://{self.domain}" + href))
+            else:
+                self.logger_callback("No link found for chapter.")
 
-                chapter_url = f"https://{self.domain}" + link.get('href')
-                self.logger_callback(f"Downloading chapter: {title} - URL: {chapter_url}")
+        # số chapter tải song song do AdaptiveConcurrency giới hạn theo host
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency.ceiling) as executor:
+            futures = {
+                executor.submit(self.download_chapter, title, chapter_url, ln_folder): title
+                for title, chapter_url in chapters
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.logger_callback(f"Error downloading chapter {futures[future]}: {e}")
 
-                chapter_response = requests.get(chapter_url)
-                chapter_soup = BeautifulSoup(chapter_response.text, 'html.parser')
+        if not self.control.is_running:
+            self.logger_callback("Download stopped by user")
 
-                filename = os.path.join(ln_folder, f"{title}.txt")
-                with open(filename, 'w', encoding='utf-8') as file:
-                    txt = f"{title}\n\n"
-                    for element in chapter_soup.find_all(id=True):
-                        try:
-                            id_num = int(element['id']) 
-                            txt += element.get_text() + "\n\n"
-                        except ValueError:
-                            pass
-                    file.write(txt)
+    def download_chapter(self, title, chapter_url, ln_folder):
+        if not self.control.wait_if_paused():
+            return
 
-                    self.logger_callback(f"Saved to: {filename}")
-            else:
-                self.logger_callback("No link found for chapter.")
\ No newline at end of file
+        filename = os.path.join(ln_folder, f"{title}.txt")
+        if os.path.exists(filename):
+            self.logger_callback(f"Chapter already downloaded: {filename}")
+            return
+
+        self.logger_callback(f"Downloading chapter: {title} - URL: {chapter_url}")
+
+        try:
+            with self.concurrency.slot(chapter_url) as slot:
+                started = time.monotonic()
+                try:
+                    chapter_response = requests.get(chapter_url, timeout=30, stream=True)
+                except requests.exceptions.RequestException:
+                    slot.record(time.monotonic() - started, error=True)
+                    raise
+                slot.record(time.monotonic() - started, chapter_response.status_code)
+                chapter_content = bandwidth.read_content(chapter_response, control=self.control)
+        except Exception as e:
+            self.logger_callback(f"Error downloading chapter {title}: {e}")
+            return
+
+        if chapter_content is None:
+            return
+
+        if chapter_response.status_code != 200:
+            self.logger_callback(f"Failed to download chapter {title}. Status code: {chapter_response.status_code}")
+            return
+
+        txt = f"{title}\n\n" + run_parser(parse_novel_chapter, chapter_content, chapter_response.encoding)
+
+        with open(filename, 'w', encoding='utf-8') as file:
+            bandwidth.throttle_write(len(txt.encode('utf-8')), self.control)
+            file.write(txt)
+
+            self.logger_callback(f"Saved to: {filename} (concurrency limits: {self.concurrency.describe()})")
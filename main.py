@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                            QHBoxLayout, QComboBox, QLineEdit, QPushButton, 
                            QTextEdit, QLabel, QFileDialog, QMessageBox)
@@ -8,8 +9,9 @@ from PyQt5.QtGui import QColor, QIcon, QPalette, QFont
 from PyQt5.QtCore import Qt
 
 from MangaDownload import MangaDownloader
-from MangaDex import TruyenDexImageDownloader
+from MangaDex import TruyenDexImageDownloader, load_translation_settings
 from light_novel import LightNovel
+from concurrency import load_limits
 
 import version
 
@@ -24,6 +26,8 @@ class DownloaderThread(QThread):
         self.output_folder = output_folder
         self.source = source
         self.is_running = True
+        self.is_paused = False
+        self.downloader = None
 
     def run(self):
         try:
@@ -39,12 +43,24 @@ class DownloaderThread(QThread):
             elif self.source in ['ln.hako.vn', 'docln.net']:
                 self.downloader = LightNovel(logger_callback=self.progress_signal.emit)
                 self.downloader.setup_domain(self.source)
-            else: # MangaDex
+            else: # MangaDex, TruyenDex, MangaDex Sync
                 self.downloader = TruyenDexImageDownloader(logger_callback=self.progress_signal.emit)
                 self.downloader.setup_title(self.source)
+                self.downloader.setup_translations(*load_translation_settings())
+
+            self.downloader.setup_concurrency(*load_limits())
+
+            if not self.is_running:
+                # Stop được bấm trong lúc downloader đang được tạo
+                self.downloader.stop()
+            elif self.is_paused:
+                # Pause được bấm trong lúc downloader đang được tạo
+                self.downloader.pause()
 
             if self.source in ['ln.hako.vn', 'docln.net']:
                 self.downloader.download_lightNovel(self.url)
+            elif self.source == 'MangaDex Sync':
+                self.downloader.sync_follow_list(self.downloader.parse_manga_ids(self.url))
             else:
                 self.downloader.download_manga(self.url)
 
@@ -52,6 +68,8 @@ class DownloaderThread(QThread):
             
             if self.is_running:
                 self.finished_signal.emit()
+            else:
+                self.progress_signal.emit("Download stopped by user")
                 
         except Exception as e:
             if self.is_running:
@@ -61,9 +79,18 @@ class DownloaderThread(QThread):
 
     def stop(self):
         self.is_running = False
-        if hasattr(self.downloader, 'stop'):
+        if self.downloader:
             self.downloader.stop()
-        self.wait()
+
+    def pause(self):
+        self.is_paused = True
+        if self.downloader:
+            self.downloader.pause()
+
+    def resume(self):
+        self.is_paused = False
+        if self.downloader:
+            self.downloader.resume()
 
 class MangaDownloaderGUI(QMainWindow):
     def __init__(self):
@@ -80,6 +107,7 @@ class MangaDownloaderGUI(QMainWindow):
         self.closing = True
         if self.downloader_thread and self.downloader_thread.isRunning():
             self.stop_download()
+            self.downloader_thread.wait()
         event.accept()
 
     def start_download(self):
@@ -142,7 +170,7 @@ class MangaDownloaderGUI(QMainWindow):
         source_label = QLabel('Source:')
         source_label.setStyleSheet('font-weight: bold;')
         self.source_combo = QComboBox()
-        self.source_combo.addItems(['MangaDex', 'TruyenDex', 'Nettruyen', 'TruyenQQ', 'ln.hako.vn', 'docln.net'])
+        self.source_combo.addItems(['MangaDex', 'TruyenDex', 'Nettruyen', 'TruyenQQ', 'ln.hako.vn', 'docln.net', 'MangaDex Sync'])
         source_layout.addWidget(source_label)
         source_layout.addWidget(self.source_combo)
         layout.addLayout(source_layout)
@@ -151,7 +179,7 @@ class MangaDownloaderGUI(QMainWindow):
         url_label = QLabel('URL:')
         url_label.setStyleSheet('font-weight: bold;')
         self.url_input = QLineEdit()
-        self.url_input.setPlaceholderText('Enter manga URL...')
+        self.url_input.setPlaceholderText('Enter manga URL... (MangaDex Sync: several MangaDex URLs or ids, separated by commas)')
         self.url_input.setStyleSheet('background-color: #f0f0f0; padding: 5px;')
         url_layout.addWidget(url_label)
         url_layout.addWidget(self.url_input)
@@ -179,6 +207,7 @@ class MangaDownloaderGUI(QMainWindow):
         self.pause_button = QPushButton('Pause')
         self.pause_button.setEnabled(False)
         self.pause_button.setStyleSheet('background-color: #ff9800; color: white; padding: 10px; border-radius: 5px;')
+        self.pause_button.clicked.connect(self.toggle_pause)
 
         self.stop_button = QPushButton('Stop')
         self.stop_button.setEnabled(False)
@@ -242,19 +271,33 @@ class MangaDownloaderGUI(QMainWindow):
         self.url_input.setEnabled(False)
         self.folder_button.setEnabled(False)
         self.stop_button.setEnabled(True)
+        self.pause_button.setEnabled(True)
+        self.pause_button.setText('Pause')
 
         self.downloader_thread = DownloaderThread(url, output_folder, source)
         self.downloader_thread.progress_signal.connect(self.update_progress)
         self.downloader_thread.error_signal.connect(self.handle_error)
-        self.downloader_thread.finished_signal.connect(self.download_finished)
+        self.downloader_thread.finished.connect(self.download_finished)
         self.downloader_thread.start()
 
+    def toggle_pause(self):
+        if not (self.downloader_thread and self.downloader_thread.isRunning()):
+            return
+
+        if self.pause_button.text() == 'Pause':
+            self.downloader_thread.pause()
+            self.pause_button.setText('Resume')
+        else:
+            self.downloader_thread.resume()
+            self.pause_button.setText('Pause')
+
     def stop_download(self):
+        # dừng hợp tác: các file đang tải dở được giữ lại dạng .part để lần sau tải tiếp
         if self.downloader_thread and self.downloader_thread.isRunning():
-            self.downloader_thread.terminate()
-            self.downloader_thread.wait()
-            self.download_finished()
-            self.update_progress("Download stopped by user")
+            self.downloader_thread.stop()
+            self.stop_button.setEnabled(False)
+            self.pause_button.setEnabled(False)
+            self.update_progress("Stopping, waiting for in-flight downloads to checkpoint...")
 
     def update_progress(self, message):
         self.log_output.append(message)
@@ -270,8 +313,12 @@ class MangaDownloaderGUI(QMainWindow):
         self.url_input.setEnabled(True)
         self.folder_button.setEnabled(True)
         self.stop_button.setEnabled(False)
+        self.pause_button.setEnabled(False)
+        self.pause_button.setText('Pause')
 
 if __name__ == '__main__':
+    # cần cho process pool parse HTML khi chạy bản exe đóng gói bằng PyInstaller
+    multiprocessing.freeze_support()
     try:
         app = QApplication(sys.argv)
         window = MangaDownloaderGUI()
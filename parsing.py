@@ -0,0 +1,81 @@
+import os
+import concurrent.futures
+from threading import Lock
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+# Các hàm parse chạy trong process riêng: chỉ nhận bytes HTML và trả về
+# dữ liệu gọn (tên, danh sách URL, text) để chi phí pickle nhỏ nhất.
+
+_pool = None
+_pool_lock = Lock()
+
+
+def parse_manga_page(html, encoding, manga_url, chapters_select):
+    soup = BeautifulSoup(html, 'html.parser', from_encoding=encoding)
+
+    manga_name = soup.select_one('h1[itemprop="name"]')
+    manga_name = manga_name.text if manga_name else "manga"
+    chapter_urls = [urljoin(manga_url, chapter.get('href')) for chapter in soup.select(chapters_select)]
+    return manga_name, chapter_urls
+
+
+def parse_chapter_page(html, encoding, chapter_url, image_select):
+    soup = BeautifulSoup(html, 'html.parser', from_encoding=encoding)
+
+    chapter_name = soup.select_one('h1')
+    chapter_name = chapter_name.text if chapter_name else urlparse(chapter_url).path.split('/')[-1]
+    # giữ None cho ảnh không có src để số thứ tự file không bị lệch
+    image_urls = []
+    for img in soup.select(image_select):
+        img_url = img.get('src') or img.get('data-src')
+        image_urls.append(urljoin(chapter_url, img_url) if img_url else None)
+    return chapter_name, image_urls
+
+
+def parse_novel_index(html, encoding):
+    soup = BeautifulSoup(html, 'html.parser', from_encoding=encoding)
+
+    chapters = []
+    for item in soup.find_all(class_='chapter-name'):
+        link = item.find('a')
+        chapters.append((link.get('title'), link.get('href')) if link else None)
+    return chapters
+
+
+def parse_novel_chapter(html, encoding):
+    soup = BeautifulSoup(html, 'html.parser', from_encoding=encoding)
+
+    txt = ""
+    for element in soup.find_all(id=True):
+        try:
+            int(element['id'])
+            txt += element.get_text() + "\n\n"
+        except ValueError:
+            pass
+    return txt
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count() or 2)
+        return _pool
+
+
+def run_parser(parser, *args):
+    """Chạy parser trong process pool dùng chung, chặn thread gọi cho tới khi có kết quả."""
+    global _pool
+    pool = get_pool()
+    try:
+        return pool.submit(parser, *args).result()
+    except concurrent.futures.process.BrokenProcessPool:
+        # process con bị kill (thiếu RAM, antivirus...): tạo pool mới rồi thử lại một lần.
+        # Chỉ thay pool nếu thread khác chưa thay trước đó.
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        pool.shutdown(wait=False)
+        return get_pool().submit(parser, *args).result()
@@ -0,0 +1,133 @@
+import importlib
+import json
+import os
+import sys
+import time
+import threading
+from datetime import datetime
+
+import pytest
+
+import bandwidth as bandwidth_module
+from bandwidth import BandwidthLimiter, TokenBucket
+from download_control import DownloadControl
+
+
+def make_limiter(tmp_path, config):
+    config_file = tmp_path / "bandwidth.json"
+    config_file.write_text(json.dumps(config))
+    limiter = BandwidthLimiter(str(config_file))
+    limiter.load_config()
+    return limiter
+
+
+@pytest.fixture
+def frozen_app(tmp_path, monkeypatch):
+    """Giả lập bản exe đóng gói nằm trong tmp_path/app rồi nạp lại module bandwidth."""
+    app_folder = tmp_path / "app"
+    app_folder.mkdir()
+    monkeypatch.setattr(sys, 'frozen', True, raising=False)
+    monkeypatch.setattr(sys, 'executable', str(app_folder / "NekoMangaNovel.exe"))
+    yield app_folder, importlib.reload(bandwidth_module)
+    monkeypatch.undo()
+    importlib.reload(bandwidth_module)
+
+
+def test_config_found_next_to_app_after_chdir(frozen_app, tmp_path, monkeypatch):
+    app_folder, reloaded = frozen_app
+    (app_folder / "bandwidth.json").write_text(json.dumps({"total": 1234}))
+
+    # DownloaderThread chdir sang thư mục lưu truyện, có bandwidth.json khác ở đó cũng không được đọc
+    save_folder = tmp_path / "downloads"
+    save_folder.mkdir()
+    (save_folder / "bandwidth.json").write_text(json.dumps({"total": 1}))
+    monkeypatch.chdir(save_folder)
+
+    limiter = reloaded.BandwidthLimiter()
+    limiter.load_config()
+    assert limiter.active_settings()['total'] == 1234
+
+
+def test_schedule_window_wrapping_midnight(tmp_path):
+    limiter = make_limiter(tmp_path, {
+        "total": 1000, "per_host": 500,
+        "schedule": [{"start": "22:00", "end": "06:00", "total": 0, "per_host": 0}],
+    })
+    night = {'total': 0, 'per_host': 0, 'disk_write': 0}
+    day = {'total': 1000, 'per_host': 500, 'disk_write': 0}
+
+    assert limiter.active_settings(datetime(2026, 1, 1, 23, 30)) == night
+    assert limiter.active_settings(datetime(2026, 1, 1, 0, 0)) == night
+    assert limiter.active_settings(datetime(2026, 1, 1, 5, 59)) == night
+    assert limiter.active_settings(datetime(2026, 1, 1, 6, 0)) == day
+    assert limiter.active_settings(datetime(2026, 1, 1, 21, 59)) == day
+
+
+def test_schedule_window_within_day(tmp_path):
+    limiter = make_limiter(tmp_path, {"schedule": [{"start": "08:00", "end": "18:00", "disk_write": 200}]})
+    assert limiter.active_settings(datetime(2026, 1, 1, 8, 0))['disk_write'] == 200
+    assert limiter.active_settings(datetime(2026, 1, 1, 18, 0))['disk_write'] == 0
+
+
+def test_missing_config_means_unlimited(tmp_path):
+    limiter = BandwidthLimiter(str(tmp_path / "missing.json"))
+    limiter.load_config()
+    assert limiter.active_settings() == {'total': 0, 'per_host': 0, 'disk_write': 0}
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=100000)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.consume(100000)
+    # 1 giây burst ban đầu, 200 KB còn lại phải chờ khoảng 2 giây
+    assert 1.8 <= time.monotonic() - started < 3
+
+
+def test_unlimited_bucket_does_not_sleep():
+    bucket = TokenBucket(rate=0)
+    started = time.monotonic()
+    bucket.consume(10 ** 9)
+    assert time.monotonic() - started < 0.1
+
+
+def test_stop_interrupts_throttle_sleep():
+    bucket = TokenBucket(rate=1000)
+    control = DownloadControl()
+    threading.Timer(0.2, control.stop).start()
+    started = time.monotonic()
+    # nợ 10 giây token nhưng Stop phải cắt ngang ngay
+    assert bucket.consume(11000, control) is False
+    assert time.monotonic() - started < 1
+
+
+def test_pause_interrupts_throttle_sleep():
+    bucket = TokenBucket(rate=1000)
+    control = DownloadControl()
+    threading.Timer(0.2, control.pause).start()
+    started = time.monotonic()
+    assert bucket.consume(11000, control) is False
+    assert time.monotonic() - started < 1
+
+
+def test_rate_change_ends_throttle_sleep():
+    bucket = TokenBucket(rate=1000)
+    threading.Timer(0.2, bucket.set_rate, args=(0,)).start()
+    started = time.monotonic()
+    assert bucket.consume(11000) is True
+    assert time.monotonic() - started < 1
+
+
+def test_config_reload_during_throttle_sleep(tmp_path):
+    config_file = tmp_path / "bandwidth.json"
+    config_file.write_text(json.dumps({"total": 1000}))
+    limiter = BandwidthLimiter(str(config_file), reload_interval=0)
+
+    def lift_limit():
+        config_file.write_text(json.dumps({"total": 0}))
+        os.utime(config_file, (time.time() + 10, time.time() + 10))
+
+    threading.Timer(0.2, lift_limit).start()
+    started = time.monotonic()
+    assert limiter.throttle_read("https://cdn.example.com/1.jpg", 11000) is True
+    assert time.monotonic() - started < 1
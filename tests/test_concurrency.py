@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from concurrency import AdaptiveConcurrency, AdaptiveLimiter, load_limits
+
+
+def test_limit_increases_additively_up_to_ceiling():
+    limiter = AdaptiveLimiter("cdn.example.com", floor=1, ceiling=4, initial=2)
+    for _ in range(3):
+        with limiter.slot() as slot:
+            slot.record(0.2, 200)
+    assert limiter.current_limit == 3
+
+    for _ in range(50):
+        with limiter.slot() as slot:
+            slot.record(0.2, 200)
+    assert limiter.current_limit == 4
+
+
+def test_failures_halve_limit_once_per_latency_window():
+    limiter = AdaptiveLimiter("cdn.example.com", floor=1, ceiling=8, initial=8)
+    with limiter.slot() as slot:
+        slot.record(0.2, 429)
+    assert limiter.current_limit == 4
+
+    with limiter.slot() as slot:
+        slot.record(0.2, 503)
+    assert limiter.current_limit == 4
+
+
+def test_limit_never_drops_below_floor():
+    limiter = AdaptiveLimiter("cdn.example.com", floor=2, ceiling=8, initial=8)
+    for _ in range(10):
+        limiter.last_decrease = 0.0
+        with limiter.slot() as slot:
+            slot.record(0.2, error=True)
+    assert limiter.current_limit == 2
+
+
+def test_client_errors_do_not_change_limit():
+    limiter = AdaptiveLimiter("cdn.example.com", initial=3)
+    with limiter.slot() as slot:
+        slot.record(0.2, 404)
+    assert limiter.limit == 3
+
+
+@pytest.mark.parametrize("floor, ceiling", [(0, 8), (5, 4), (1.5, 8)])
+def test_invalid_limits_are_rejected(floor, ceiling):
+    with pytest.raises(ValueError):
+        AdaptiveConcurrency(floor=floor, ceiling=ceiling)
+    with pytest.raises(ValueError):
+        AdaptiveConcurrency().setup(floor, ceiling)
+
+
+def test_setup_clamps_existing_limiters():
+    concurrency = AdaptiveConcurrency(initial=6)
+    limiter = concurrency.for_url("https://cdn.example.com/1.jpg")
+    concurrency.setup(1, 3)
+    assert limiter.current_limit == 3
+    assert concurrency.for_url("https://cdn.example.com/2.jpg") is limiter
+
+
+def test_load_limits(tmp_path):
+    config_file = tmp_path / "concurrency.json"
+    assert load_limits(str(config_file)) == (1, 8)
+
+    config_file.write_text(json.dumps({"floor": 2, "ceiling": 16}))
+    assert load_limits(str(config_file)) == (2, 16)
+
+    config_file.write_text(json.dumps({"floor": 0}))
+    with pytest.raises(ValueError):
+        load_limits(str(config_file))
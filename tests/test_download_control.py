@@ -0,0 +1,106 @@
+import os
+import time
+
+import pytest
+
+from download_control import DownloadControl, part_path, resume_headers, write_stream
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", content_range=None, on_chunk=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {'Content-Range': content_range} if content_range else {}
+        self.url = "https://cdn.example.com/001.jpg"
+        self.on_chunk = on_chunk
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for index in range(0, len(self.body), 2):
+            if self.on_chunk:
+                self.on_chunk(index // 2)
+            yield self.body[index:index + 2]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(self.status_code)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def save_path(tmp_path):
+    return str(tmp_path / "001.jpg")
+
+
+def write_part(save_path, data):
+    with open(part_path(save_path), 'wb') as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_pause_keeps_part_and_resume_appends_with_range(save_path):
+    control = DownloadControl()
+
+    def pause_on_third_chunk(index):
+        if index == 2:
+            control.pause()
+
+    response = FakeResponse(200, b"abcdefgh", on_chunk=pause_on_third_chunk)
+    assert write_stream(response, save_path, control) is False
+    assert response.closed
+    assert read(part_path(save_path)) == b"abcd"
+    assert resume_headers(save_path) == {'Range': 'bytes=4-'}
+
+    control.resume()
+    assert write_stream(FakeResponse(206, b"efgh", "bytes 4-7/8"), save_path, control) is True
+    assert read(save_path) == b"abcdefgh"
+
+
+def test_200_restarts_from_scratch(save_path):
+    write_part(save_path, b"stale")
+    assert write_stream(FakeResponse(200, b"fresh"), save_path, DownloadControl()) is True
+    assert read(save_path) == b"fresh"
+
+
+def test_206_at_wrong_offset_drops_part(save_path):
+    write_part(save_path, b"abc")
+    assert write_stream(FakeResponse(206, b"zz", "bytes 10-11/12"), save_path, DownloadControl()) is False
+    assert not os.path.exists(save_path)
+    assert not os.path.exists(part_path(save_path))
+
+
+def test_206_without_range_is_never_written_as_full_file(save_path):
+    with pytest.raises(IOError):
+        write_stream(FakeResponse(206, b"ab", "bytes 0-1/12"), save_path, DownloadControl())
+    assert not os.path.exists(save_path)
+
+
+def test_416_accepts_part_only_with_matching_size(save_path):
+    write_part(save_path, b"complete")
+    assert write_stream(FakeResponse(416, content_range="bytes */8"), save_path, DownloadControl()) is True
+    assert read(save_path) == b"complete"
+
+
+def test_416_with_wrong_size_drops_part(save_path):
+    write_part(save_path, b"garbage-too-long")
+    assert write_stream(FakeResponse(416, content_range="bytes */8"), save_path, DownloadControl()) is False
+    assert not os.path.exists(save_path)
+    assert not os.path.exists(part_path(save_path))
+    assert 'Range' not in resume_headers(save_path)
+
+
+def test_stop_wakes_sleepers_and_is_permanent():
+    control = DownloadControl()
+    control.pause()
+    control.stop()
+    started = time.monotonic()
+    assert control.sleep(10) is False
+    assert control.wait_if_paused() is False
+    assert time.monotonic() - started < 1
+    assert not control.is_running
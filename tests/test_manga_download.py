@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+pytest.importorskip("cloudscraper")
+requests = pytest.importorskip("requests")
+
+import MangaDownload
+from download_control import part_path
+
+
+class StreamResponse:
+    def __init__(self, status_code, chunks, content_range=None, fail_after=None):
+        self.status_code = status_code
+        self.chunks = chunks
+        self.headers = {'Content-Range': content_range} if content_range else {}
+        self.url = "https://cdn.example.com/001.jpg"
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.fail_after = fail_after
+
+    def iter_content(self, chunk_size):
+        for index, chunk in enumerate(self.chunks):
+            if index == self.fail_after:
+                raise requests.exceptions.ChunkedEncodingError("connection dropped")
+            yield chunk
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(self.status_code)
+
+    def close(self):
+        pass
+
+
+def test_retry_after_dropped_connection_resumes_from_grown_part(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    downloader = MangaDownload.MangaDownloader()
+    monkeypatch.setattr(downloader.control, 'sleep', lambda seconds: True)
+
+    save_path = str(tmp_path / "001.jpg")
+    with open(part_path(save_path), 'wb') as f:
+        f.write(b"ab")
+
+    sent_ranges = []
+    responses = [
+        StreamResponse(206, [b"cd", b"ef"], "bytes 2-7/8", fail_after=1),
+        StreamResponse(206, [b"ef", b"gh"], "bytes 4-7/8"),
+    ]
+
+    def fake_get(url, headers=None, **kwargs):
+        sent_ranges.append(headers.get('Range'))
+        return responses.pop(0)
+
+    monkeypatch.setattr(MangaDownload.requests, 'get', fake_get)
+
+    assert downloader.download_image("https://cdn.example.com/001.jpg", "https://site.example/chap-1", save_path)
+    assert sent_ranges == ['bytes=2-', 'bytes=4-']
+    with open(save_path, 'rb') as f:
+        assert f.read() == b"abcdefgh"
+    assert not os.path.exists(part_path(save_path))
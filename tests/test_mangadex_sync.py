@@ -0,0 +1,155 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+import MangaDex
+
+
+def make_downloader(tmp_path, languages=('vi',), preferred_groups=()):
+    downloader = MangaDex.TruyenDexImageDownloader(lambda message: None)
+    downloader.setup_translations(list(languages), list(preferred_groups))
+    downloader.sync_state_file = str(tmp_path / "mangadex_sync.json")
+    return downloader
+
+
+def feed_item(chapter_id, updated_at, chapter='1', language='vi', groups=(), external=None):
+    return {
+        'id': chapter_id,
+        'attributes': {
+            'volume': '1',
+            'chapter': chapter,
+            'translatedLanguage': language,
+            'updatedAt': updated_at,
+            'externalUrl': external,
+        },
+        'relationships': [{'type': 'manga', 'id': 'm1'}] + [
+            {'type': 'scanlation_group', 'id': group_id, 'attributes': {'name': name}} for group_id, name in groups
+        ],
+    }
+
+
+def test_fetch_feed_rolls_over_offset_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(MangaDex, 'FEED_PAGE_LIMIT', 2)
+    monkeypatch.setattr(MangaDex, 'FEED_OFFSET_CAP', 4)
+    items = [feed_item(f"c{i}", f"2026-01-01T00:00:0{i}+00:00") for i in range(7)]
+    requests_seen = []
+
+    def fake_get_json(path, params=None):
+        since = params.get('updatedAtSince', '')
+        offset, limit = params['offset'], params['limit']
+        requests_seen.append((since, offset))
+        # server trả lỗi nếu offset + limit vượt giới hạn
+        assert offset + limit <= MangaDex.FEED_OFFSET_CAP
+        matching = [item for item in items if item['attributes']['updatedAt'][:19] >= since]
+        return {'data': matching[offset:offset + limit], 'total': len(matching)}
+
+    downloader = make_downloader(tmp_path)
+    monkeypatch.setattr(downloader, 'get_json', fake_get_json)
+
+    result = downloader.fetch_feed("/chapter", {})
+    assert sorted(item['id'] for item in result) == [f"c{i}" for i in range(7)]
+    assert requests_seen == [
+        ('', 0), ('', 2),
+        ('2026-01-01T00:00:03', 0), ('2026-01-01T00:00:03', 2),
+    ]
+
+
+def test_fetch_feed_returns_none_when_a_page_fails(tmp_path, monkeypatch):
+    pages = [{'data': [feed_item("c0", "2026-01-01T00:00:00")], 'total': 5}, None]
+    downloader = make_downloader(tmp_path)
+    monkeypatch.setattr(downloader, 'get_json', lambda path, params=None: pages.pop(0))
+    assert downloader.fetch_feed("/chapter", {}) is None
+
+
+def test_select_chapters_prefers_language_then_group(tmp_path):
+    downloader = make_downloader(tmp_path, languages=['vi', 'en'], preferred_groups=['g2'])
+    entries = [
+        downloader.chapter_entry(feed_item("en-g2", "2026-01-01T00:00:00", language='en', groups=[('g2', 'Group 2')])),
+        downloader.chapter_entry(feed_item("vi-g1", "2026-01-01T00:00:00", groups=[('g1', 'Group 1')])),
+        downloader.chapter_entry(feed_item("vi-g2", "2026-01-01T00:00:00", groups=[('g2', 'Group 2')])),
+        downloader.chapter_entry(feed_item("vi-ext", "2026-01-01T00:00:00", chapter='2', external='https://x')),
+        downloader.chapter_entry(feed_item("vi-ch3", "2026-01-01T00:00:00", chapter='3')),
+    ]
+
+    assert downloader.chapter_rank(entries[0]) == (1, 0)
+    assert downloader.chapter_rank(entries[1]) == (0, 1)
+    assert downloader.chapter_rank(entries[2]) == (0, 0)
+    # chapter 2 chỉ có link ngoài nên bị bỏ qua
+    assert sorted(entry['id'] for entry in downloader.select_chapters(entries)) == ["vi-ch3", "vi-g2"]
+
+
+def test_preferred_group_matches_by_name(tmp_path):
+    downloader = make_downloader(tmp_path, preferred_groups=['Group 1'])
+    entry = downloader.chapter_entry(feed_item("c1", "2026-01-01T00:00:00", groups=[('g1', 'Group 1')]))
+    assert downloader.chapter_rank(entry) == (0, 0)
+
+
+def test_claim_chapter_skips_or_replaces_other_translations(tmp_path):
+    downloader = make_downloader(tmp_path, preferred_groups=['g1'])
+    manga_folder = str(tmp_path / "manga_m1")
+    state = {'last_sync': {}, 'chapters': {}}
+
+    g2 = downloader.chapter_entry(feed_item("by-g2", "2026-01-01T00:00:00", groups=[('g2', 'Group 2')]))
+    g3 = downloader.chapter_entry(feed_item("by-g3", "2026-01-01T00:00:00", groups=[('g3', 'Group 3')]))
+    g1 = downloader.chapter_entry(feed_item("by-g1", "2026-01-01T00:00:00", groups=[('g1', 'Group 1')]))
+
+    assert downloader.claim_chapter(state, g2, manga_folder)
+    chapter_folder = downloader.chapter_folder(manga_folder, '1', '1')
+    os.makedirs(chapter_folder)
+    open(os.path.join(chapter_folder, "1.jpg"), 'wb').close()
+
+    # nhóm khác nhưng không được ưu tiên hơn: giữ bản cũ
+    assert not downloader.claim_chapter(state, g3, manga_folder)
+    assert os.path.exists(os.path.join(chapter_folder, "1.jpg"))
+    assert state['chapters']['m1']['1/1']['id'] == "by-g2"
+
+    # cùng bản dịch (ví dụ lần tải trước bị dừng) thì tải tiếp
+    assert downloader.claim_chapter(state, g2, manga_folder)
+    assert os.path.exists(chapter_folder)
+
+    # nhóm ưu tiên hơn: xoá thư mục cũ để ảnh không lẫn
+    assert downloader.claim_chapter(state, g1, manga_folder)
+    assert not os.path.exists(chapter_folder)
+    assert state['chapters']['m1']['1/1'] == {'id': "by-g1", 'language': 'vi', 'groups': [['g1', 'Group 1']]}
+
+
+def test_load_sync_state_migrates_legacy_format(tmp_path):
+    downloader = make_downloader(tmp_path)
+    with open(downloader.sync_state_file, 'w') as f:
+        json.dump({"m1": "2026-01-01T00:00:00"}, f)
+
+    assert downloader.load_sync_state() == {'last_sync': {"m1": "2026-01-01T00:00:00"}, 'chapters': {}}
+
+
+def test_load_sync_state_round_trip(tmp_path):
+    downloader = make_downloader(tmp_path)
+    assert downloader.load_sync_state() == {'last_sync': {}, 'chapters': {}}
+
+    state = {'last_sync': {"m1": "2026-01-01T00:00:00"}, 'chapters': {"m1": {"1/1": {'id': "c1"}}}}
+    downloader.save_sync_state(state)
+    assert downloader.load_sync_state() == state
+
+
+def test_fetch_manga_titles_separates_missing_from_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(MangaDex, 'IDS_BATCH_SIZE', 2)
+    responses = [
+        {'data': [{'id': "a", 'attributes': {'title': {'en': "Title A"}}}]},
+        None,
+    ]
+    batches = []
+
+    def fake_get_json(path, params=None):
+        batches.append(params['ids[]'])
+        return responses.pop(0)
+
+    downloader = make_downloader(tmp_path)
+    monkeypatch.setattr(downloader, 'get_json', fake_get_json)
+
+    titles, missing = downloader.fetch_manga_titles(["a", "b", "c", "d"])
+    assert batches == [["a", "b"], ["c", "d"]]
+    # "b" không có trong câu trả lời nên là không tồn tại, "c" và "d" chỉ do request lỗi
+    assert missing == ["b"]
+    assert titles == {"a": "Title A", "c": "c", "d": "d"}
@@ -0,0 +1,122 @@
+import concurrent.futures
+
+import pytest
+
+pytest.importorskip("bs4")
+
+import parsing
+from parsing import parse_chapter_page, parse_manga_page, parse_novel_chapter, parse_novel_index, run_parser
+
+
+class BrokenPool:
+    def __init__(self, replacement=None):
+        self.replacement = replacement
+        self.shut_down = False
+
+    def submit(self, parser, *args):
+        if self.replacement:
+            # thread khác đã thay pool trong lúc pool này hỏng
+            parsing._pool = self.replacement
+        future = concurrent.futures.Future()
+        future.set_exception(concurrent.futures.process.BrokenProcessPool("worker killed"))
+        return future
+
+    def shutdown(self, wait=True, **kwargs):
+        self.shut_down = True
+
+
+class InlinePool:
+    def submit(self, parser, *args):
+        future = concurrent.futures.Future()
+        future.set_result(parser(*args))
+        return future
+
+    def shutdown(self, wait=True, **kwargs):
+        pass
+
+
+@pytest.fixture
+def pool_slot(monkeypatch):
+    monkeypatch.setattr(parsing, '_pool', None)
+    yield
+    if parsing._pool is not None:
+        parsing._pool.shutdown()
+
+
+def test_parse_chapter_page_keeps_numbering_and_joins_urls():
+    html = (
+        '<html><body><h1>Chapter 5</h1>'
+        '<img class="page" src="/img/1.jpg">'
+        '<img class="page">'
+        '<img class="page" data-src="//cdn.example.com/3.jpg">'
+        '</body></html>'
+    ).encode('utf-8')
+
+    name, urls = parse_chapter_page(html, 'utf-8', 'https://site.example/manga/chap-5', 'img.page')
+    assert name == "Chapter 5"
+    # ảnh không có src vẫn giữ chỗ để file 3 không thành file 2
+    assert urls == ["https://site.example/img/1.jpg", None, "https://cdn.example.com/3.jpg"]
+
+
+def test_parse_chapter_page_falls_back_to_url_name():
+    name, urls = parse_chapter_page(b"<html><body></body></html>", 'utf-8', 'https://site.example/manga/chap-5', 'img')
+    assert (name, urls) == ("chap-5", [])
+
+
+def test_parse_chapter_page_uses_response_encoding():
+    html = '<html><body><h1>Chương 1</h1></body></html>'.encode('cp1258')
+    name, _ = parse_chapter_page(html, 'cp1258', 'https://site.example/chap-1', 'img')
+    assert name == "Chương 1"
+
+
+def test_parse_manga_page():
+    html = (
+        '<h1 itemprop="name">Neko</h1>'
+        '<div class="chapter"><a href="/neko/chap-2">2</a></div>'
+        '<div class="chapter"><a href="https://other.example/chap-1">1</a></div>'
+    ).encode('utf-8')
+    name, urls = parse_manga_page(html, 'utf-8', 'https://site.example/neko', 'div.chapter a')
+    assert name == "Neko"
+    assert urls == ["https://site.example/neko/chap-2", "https://other.example/chap-1"]
+
+
+def test_parse_novel_index_keeps_missing_links():
+    html = (
+        '<div class="chapter-name"><a title="Chương 1" href="/c/1">1</a></div>'
+        '<div class="chapter-name">no link</div>'
+        '<div class="chapter-name"><a title="Chương 2" href="/c/2">2</a></div>'
+    ).encode('utf-8')
+    assert parse_novel_index(html, 'utf-8') == [("Chương 1", "/c/1"), None, ("Chương 2", "/c/2")]
+
+
+def test_parse_novel_chapter_keeps_only_numeric_ids():
+    html = (
+        '<div id="chapter-content">'
+        '<p id="1">Đoạn một</p><p id="note">Ghi chú</p><p id="2">Đoạn hai</p><p>Không id</p>'
+        '</div>'
+    ).encode('utf-8')
+    assert parse_novel_chapter(html, 'utf-8') == "Đoạn một\n\nĐoạn hai\n\n"
+
+
+def test_run_parser_uses_process_pool(pool_slot):
+    assert run_parser(parse_novel_chapter, b'<p id="1">text</p>', 'utf-8') == "text\n\n"
+    assert isinstance(parsing._pool, concurrent.futures.ProcessPoolExecutor)
+
+
+def test_run_parser_replaces_broken_pool(pool_slot):
+    broken = BrokenPool()
+    parsing._pool = broken
+
+    assert run_parser(parse_novel_chapter, b'<p id="1">text</p>', 'utf-8') == "text\n\n"
+    assert broken.shut_down
+    assert isinstance(parsing._pool, concurrent.futures.ProcessPoolExecutor)
+
+
+def test_run_parser_keeps_pool_replaced_by_another_thread(pool_slot):
+    replacement = InlinePool()
+    broken = BrokenPool(replacement)
+    parsing._pool = broken
+
+    assert run_parser(parse_novel_chapter, b'<p id="1">text</p>', 'utf-8') == "text\n\n"
+    assert broken.shut_down
+    assert parsing._pool is replacement